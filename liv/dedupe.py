@@ -0,0 +1,81 @@
+import PIL.Image
+
+HASH_BITS = 64
+
+
+def dhash(img):
+    """
+    Compute a 64-bit difference hash of an image.  Similar looking images
+    have hashes that differ in few bits.
+
+    :param img: a PIL image.
+    :returns: an integer hash.
+    """
+    gray = img.convert('L').resize((9, 8), PIL.Image.Resampling.BOX)
+    pixels = gray.tobytes()
+    value = 0
+    for y in range(8):
+        for x in range(8):
+            value = (value << 1) | (pixels[y * 9 + x] < pixels[y * 9 + x + 1])
+    return value
+
+
+class HashIndex:
+    """
+    An in-memory index of hashes that finds any stored hash within a maximum
+    hamming distance without comparing against every entry.
+
+    Each hash is split into maxDistance + 1 pieces.  Two hashes that differ in
+    at most maxDistance bits must have at least one identical piece, so only
+    hashes sharing a piece with the query are compared.
+    """
+
+    def __init__(self, maxDistance=4):
+        self.maxDistance = maxDistance
+        pieces = min(maxDistance + 1, HASH_BITS)
+        bounds = [HASH_BITS * idx // pieces for idx in range(pieces + 1)]
+        self._pieces = [(bounds[idx], (1 << (bounds[idx + 1] - bounds[idx])) - 1)
+                        for idx in range(pieces)]
+        self._tables = [{} for _ in self._pieces]
+        self._keys = {}
+        self._hashKeys = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _parts(self, value):
+        return [(value >> shift) & mask for shift, mask in self._pieces]
+
+    def find(self, value):
+        """
+        Find a stored key whose hash is near a value.
+
+        :param value: the hash to look up.
+        :returns: the key of a near match or None.
+        """
+        for table, part in zip(self._tables, self._parts(value)):
+            for other in table.get(part, ()):
+                if bin(other ^ value).count('1') <= self.maxDistance:
+                    return self._hashKeys[other][0]
+        return None
+
+    def add(self, value, key):
+        self.remove(key)
+        self._keys[key] = value
+        self._hashKeys.setdefault(value, []).append(key)
+        if len(self._hashKeys[value]) == 1:
+            for table, part in zip(self._tables, self._parts(value)):
+                table.setdefault(part, []).append(value)
+
+    def remove(self, key):
+        value = self._keys.pop(key, None)
+        if value is None:
+            return
+        self._hashKeys[value].remove(key)
+        if self._hashKeys[value]:
+            return
+        del self._hashKeys[value]
+        for table, part in zip(self._tables, self._parts(value)):
+            table[part].remove(value)
+            if not table[part]:
+                del table[part]
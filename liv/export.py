@@ -0,0 +1,244 @@
+import concurrent.futures
+import io
+import json
+import logging
+import math
+import os
+import shutil
+import urllib.parse
+
+import PIL.Image
+
+try:
+    from . import httpsource
+except ImportError:
+    import httpsource
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_FILE = '.progress'
+ARCHIVE_DATA = 'tiles.bin'
+ARCHIVE_INDEX = 'tiles.json'
+
+
+def _open_source(source, opts):
+    # importing here avoids a circular import
+    try:
+        from .liv import open_source
+    except ImportError:
+        from liv import open_source
+    return open_source(source, opts)
+
+
+def is_blank(data):
+    # Only fully transparent tiles are skipped; a uniform color is still
+    # image content.
+    try:
+        img = PIL.Image.open(io.BytesIO(data))
+        if img.mode == 'P' or 'transparency' in img.info:
+            img = img.convert('RGBA')
+        if 'A' not in img.getbands():
+            return False
+        return img.getchannel('A').getextrema() == (0, 0)
+    except Exception:
+        return False
+
+
+def level_tiles(metadata, z):
+    scale = 2 ** (metadata['levels'] - 1 - z)
+    return (math.ceil(metadata['sizeX'] / scale / metadata['tileWidth']),
+            math.ceil(metadata['sizeY'] / scale / metadata['tileHeight']))
+
+
+def render_row(source, opts, z, y, count, path):
+    """
+    Render one row of tiles in a worker process.
+
+    :param source: the source to export.
+    :param opts: the command line options.
+    :param z: the tile level.
+    :param y: the tile row.
+    :param count: the number of tiles in the row.
+    :param path: if not None, write tiles as files under this directory
+        rather than returning their data.
+    :returns: a list of (x, data) for tiles that were not skipped as
+        transparent or, if path is set, a list of the x values that were
+        written.
+    """
+    ts = _open_source(source, opts)
+    frame = max(opts.frame, 0)
+    results = []
+    for x in range(count):
+        data = ts.getTile(x, y, z, frame=frame)
+        if not opts.export_keep_blank and is_blank(data):
+            continue
+        if path is None:
+            results.append((x, data))
+            continue
+        tilePath = os.path.join(path, 'zxy', str(z), str(x), str(y))
+        os.makedirs(os.path.dirname(tilePath), exist_ok=True)
+        with open(tilePath + '.tmp', 'wb') as fptr:
+            fptr.write(data)
+        os.replace(tilePath + '.tmp', tilePath)
+        results.append(x)
+    return results
+
+
+def source_signature(source, opts):
+    signature = {'source': source, 'format': opts.export_format, 'frame': max(opts.frame, 0)}
+    if source.startswith(('https://', 'http://')):
+        remote = httpsource.open_url(source)
+        signature['size'] = remote.size
+        signature['version'] = remote.version
+    elif os.path.isfile(source):
+        stat = os.stat(source)
+        signature['size'] = stat.st_size
+        signature['mtime'] = stat.st_mtime_ns
+    return signature
+
+
+def read_progress(path, signature):
+    """
+    Read the rows that a previous export completed.
+
+    :param path: the output directory.
+    :param signature: a dictionary describing the source and export options.
+        If the previous export was of something else, an exception is raised
+        rather than mixing the two.
+    :returns: a dictionary of completed (z, y) rows to their archive index
+        entries.
+    """
+    done = {}
+    try:
+        with open(os.path.join(path, PROGRESS_FILE)) as fptr:
+            for idx, line in enumerate(fptr):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a partial line from an interrupted run
+                    continue
+                if idx == 0:
+                    if entry != signature:
+                        msg = (f'{path} contains a partial export of '
+                               f'{entry.get("source")} with different options')
+                        raise Exception(msg)
+                    continue
+                done[tuple(entry['row'])] = entry.get('tiles', {})
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def copy_viewer(path):
+    web_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web')
+    os.makedirs(os.path.join(path, 'web'), exist_ok=True)
+    shutil.copy(os.path.join(web_dir, 'index.html'), os.path.join(path, 'index.html'))
+    for file in ('main.js', 'geo.min.js'):
+        shutil.copy(os.path.join(web_dir, file), os.path.join(path, 'web', file))
+
+
+def export_source(source, path, opts):
+    """
+    Write the tile pyramid, metadata, and web viewer for a source so that it
+    can be served by any static file server.  Interrupted exports resume
+    from the last completed row of tiles.
+
+    :param source: the source to export.
+    :param path: the output directory.
+    :param opts: the command line options.  export_format is either 'files'
+        for individual {z}/{x}/{y} tiles or 'archive' for a single data file
+        with a json index of offsets and lengths.
+    """
+    os.makedirs(path, exist_ok=True)
+    ts = _open_source(source, opts)
+    metadata = ts.metadata
+    archive = opts.export_format == 'archive'
+    signature = source_signature(source, opts)
+    done = read_progress(path, signature)
+    index = {}
+    dataFile = None
+    if archive:
+        for tiles in done.values():
+            index.update(tiles)
+        end = max((offset + length for offset, length in index.values()), default=0)
+        dataFile = open(os.path.join(path, ARCHIVE_DATA), 'ab')
+        # discard anything written after the last recorded row
+        dataFile.truncate(end)
+        dataFile.seek(end)
+    rows = [(z, y, level_tiles(metadata, z)[0])
+            for z in range(metadata['levels'])
+            for y in range(level_tiles(metadata, z)[1])
+            if (z, y) not in done]
+    logger.info('Exporting %s to %s: %d rows of tiles remaining', source, path, len(rows))
+    try:
+        with open(os.path.join(path, PROGRESS_FILE), 'a') as progress, \
+                concurrent.futures.ProcessPoolExecutor(opts.export_workers) as pool:
+            if not progress.tell():
+                progress.write(json.dumps(signature) + '\n')
+                progress.flush()
+            futures = {
+                pool.submit(render_row, source, opts, z, y, count,
+                            None if archive else path): (z, y)
+                for z, y, count in rows}
+            for future in concurrent.futures.as_completed(futures):
+                z, y = futures[future]
+                tiles = {}
+                if archive:
+                    for x, data in future.result():
+                        tiles[f'{z}/{x}/{y}'] = [dataFile.tell(), len(data)]
+                        dataFile.write(data)
+                    dataFile.flush()
+                    index.update(tiles)
+                else:
+                    future.result()
+                progress.write(json.dumps({'row': [z, y], 'tiles': tiles}) + '\n')
+                progress.flush()
+    finally:
+        if dataFile:
+            dataFile.close()
+    metadata = dict(metadata)
+    metadata['exportedFrame'] = max(opts.frame, 0)
+    if archive:
+        with open(os.path.join(path, ARCHIVE_INDEX), 'w') as fptr:
+            json.dump(index, fptr, separators=(',', ':'))
+        metadata['tileArchive'] = {'data': ARCHIVE_DATA, 'index': ARCHIVE_INDEX}
+    with open(os.path.join(path, 'metadata'), 'w') as fptr:
+        json.dump(metadata, fptr, default=str)
+    copy_viewer(path)
+
+
+def export_paths(sources, root):
+    """
+    Pick a distinct output directory for each source.  Local files keep their
+    paths relative to the deepest directory they share, and urls use their
+    host and path.
+    """
+    if len(sources) == 1:
+        return {sources[0]: root}
+    local = [os.path.abspath(source) for source in sources
+             if not source.startswith(('https://', 'http://'))]
+    common = os.path.commonpath([os.path.dirname(source) for source in local]) if local else ''
+    paths = {}
+    used = set()
+    for source in sources:
+        if source.startswith(('https://', 'http://')):
+            parts = urllib.parse.urlsplit(source)
+            name = os.path.join(parts.netloc.replace(':', '_'), *parts.path.strip('/').split('/'))
+        else:
+            name = os.path.relpath(os.path.abspath(source), common)
+        name = candidate = os.path.normpath(name)
+        idx = 1
+        while candidate in used:
+            idx += 1
+            candidate = f'{name}_{idx}'
+        used.add(candidate)
+        paths[source] = os.path.join(root, candidate)
+    return paths
+
+
+def export_sources(sources, opts):
+    for source, path in export_paths(sources, opts.export).items():
+        try:
+            export_source(source, path, opts)
+        except Exception:
+            logger.exception('Could not export %s', source)
@@ -0,0 +1,387 @@
+import collections
+import concurrent.futures
+import hashlib
+import http.client
+import io
+import logging
+import os
+import tempfile
+import threading
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 256 * 1024
+DEFAULT_READ_AHEAD = 4
+DEFAULT_CACHE_SIZE = 256 * 1024 ** 2
+DEFAULT_DISK_CACHE_SIZE = 4096 * 1024 ** 2
+DEFAULT_DISK_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'liv-http-cache')
+
+
+class RangeNotSupportedError(OSError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Keep idle keep-alive connections per scheme and host so that successive
+    range requests don't each pay for a new TCP and TLS handshake.
+    """
+
+    def __init__(self, maxPerHost=8, timeout=60):
+        self.maxPerHost = maxPerHost
+        self.timeout = timeout
+        self._idle = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            if self._idle[key]:
+                return self._idle[key].pop(), True
+        scheme, netloc = key
+        cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return cls(netloc, timeout=self.timeout), False
+
+    def _put(self, key, conn):
+        with self._lock:
+            if len(self._idle[key]) < self.maxPerHost:
+                self._idle[key].append(conn)
+                return
+        conn.close()
+
+    def request(self, method, url, headers=None):
+        """
+        Make a request, reusing an idle connection when possible.
+
+        :param method: the http method.
+        :param url: the full url.
+        :param headers: an optional dictionary of headers.
+        :returns: status, a dictionary of lowercase response headers, and the
+            response body.  If a Range header was sent and the server replies
+            with the whole file, RangeNotSupportedError is raised without
+            reading the body.
+        """
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        headers = dict(headers or {})
+        headers.setdefault('Connection', 'keep-alive')
+        while True:
+            conn, reused = self._get(key)
+            try:
+                conn.request(method, path, headers=headers)
+                resp = conn.getresponse()
+                if 'Range' in headers and resp.status == 200:
+                    # Don't download the whole file when asking for part of it
+                    conn.close()
+                    msg = f'{url} does not support range requests'
+                    raise RangeNotSupportedError(msg)
+                body = resp.read()
+            except RangeNotSupportedError:
+                raise
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                # An idle connection may have been dropped by the server;
+                # retry on a fresh one.
+                if reused:
+                    continue
+                raise
+            respHeaders = {k.lower(): v for k, v in resp.getheaders()}
+            if resp.will_close:
+                conn.close()
+            else:
+                self._put(key, conn)
+            return resp.status, respHeaders, body
+
+
+class BlockCache:
+    """
+    A least-recently-used cache of fixed size blocks of remote files, capped
+    by the total number of bytes held.
+    """
+
+    def __init__(self, maxSize=DEFAULT_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.size = 0
+        self._blocks = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._blocks.get(key)
+            if data is not None:
+                self._blocks.move_to_end(key)
+            return data
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._blocks
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._blocks:
+                self.size -= len(self._blocks.pop(key))
+            if len(data) > self.maxSize:
+                return
+            self._blocks[key] = data
+            self.size += len(data)
+            while self.size > self.maxSize:
+                _, old = self._blocks.popitem(last=False)
+                self.size -= len(old)
+
+
+defaultPool = ConnectionPool()
+defaultCache = BlockCache()
+
+
+class HttpFile(io.RawIOBase):
+    """
+    A seekable, read-only file-like object backed by http range requests.
+
+    Reads are satisfied from a shared block cache.  Missing blocks that are
+    adjacent are coalesced into a single range request, and a request that
+    ends on a missing block is extended by a number of read-ahead blocks.
+    """
+
+    def __init__(self, url, pool=None, cache=None, blockSize=DEFAULT_BLOCK_SIZE,
+                 readAhead=DEFAULT_READ_AHEAD):
+        super().__init__()
+        self.url = url
+        self.name = url
+        self.pool = pool if pool is not None else defaultPool
+        self.cache = cache if cache is not None else defaultCache
+        self.blockSize = blockSize
+        self.readAhead = readAhead
+        self._pos = 0
+        self._lock = threading.Lock()
+        self.version = ''
+        self.size = self._get_size()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.url!r})'
+
+    def _get_size(self):
+        status, headers, _ = self.pool.request('GET', self.url, {'Range': 'bytes=0-0'})
+        if status == 206 and '/' in headers.get('content-range', ''):
+            total = headers['content-range'].rsplit('/', 1)[1]
+            if total != '*':
+                self.version = headers.get('etag') or headers.get('last-modified') or ''
+                return int(total)
+        msg = f'Cannot read {self.url}: http status {status}'
+        raise OSError(msg)
+
+    def _store(self, start, data):
+        for offset in range(0, len(data), self.blockSize):
+            idx = (start + offset) // self.blockSize
+            self.cache.put((self.url, idx), data[offset:offset + self.blockSize])
+
+    def _fetch(self, first, last, store=True):
+        start = first * self.blockSize
+        end = min(self.size, (last + 1) * self.blockSize) - 1
+        logger.debug('Fetching %s bytes %d-%d', self.url, start, end)
+        status, headers, body = self.pool.request(
+            'GET', self.url, {'Range': f'bytes={start}-{end}'})
+        if status != 206:
+            msg = f'Cannot read {self.url}: http status {status}'
+            raise OSError(msg)
+        if store:
+            self._store(start, body)
+        return body
+
+    def _blocks(self, first, last):
+        """
+        Get a list of the data for each block in an inclusive range, fetching
+        missing blocks in as few requests as possible.
+        """
+        lastBlock = (self.size - 1) // self.blockSize
+        result = {}
+        runs = []
+        for idx in range(first, last + 1):
+            data = self.cache.get((self.url, idx))
+            if data is not None:
+                result[idx] = data
+            elif runs and runs[-1][1] == idx - 1:
+                runs[-1][1] = idx
+            else:
+                runs.append([idx, idx])
+        if runs and runs[-1][1] == last:
+            ahead = last
+            while (ahead < min(lastBlock, last + self.readAhead) and
+                   (self.url, ahead + 1) not in self.cache):
+                ahead += 1
+            runs[-1][1] = ahead
+        for runFirst, runLast in runs:
+            data = self._fetch(runFirst, runLast)
+            for idx in range(runFirst, min(runLast, last) + 1):
+                offset = (idx - runFirst) * self.blockSize
+                result[idx] = data[offset:offset + self.blockSize]
+        return [result[idx] for idx in range(first, last + 1)]
+
+    def pread(self, size, offset):
+        if offset >= self.size or size <= 0:
+            return b''
+        end = min(self.size, offset + size)
+        first = offset // self.blockSize
+        last = (end - 1) // self.blockSize
+        data = b''.join(self._blocks(first, last))
+        start = offset - first * self.blockSize
+        return data[start:start + end - offset]
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        with self._lock:
+            if whence == io.SEEK_CUR:
+                offset += self._pos
+            elif whence == io.SEEK_END:
+                offset += self.size
+            if offset < 0:
+                msg = 'negative seek position'
+                raise ValueError(msg)
+            self._pos = offset
+            return self._pos
+
+    def read(self, size=-1):
+        with self._lock:
+            if size is None or size < 0:
+                size = self.size - self._pos
+            data = self.pread(size, self._pos)
+            self._pos += len(data)
+            return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def download(self, path, workers=None):
+        """
+        Copy the whole file to a local path using parallel range requests of
+        a block plus the read-ahead at a time.  The in-memory block cache is
+        bypassed.
+
+        :param path: the local file to write.
+        :param workers: the number of concurrent requests.  Defaults to the
+            number of connections the pool keeps per host.
+        """
+        step = self.readAhead + 1
+        lastBlock = (self.size - 1) // self.blockSize if self.size else -1
+        lock = threading.Lock()
+        with open(path, 'wb') as fptr:
+            fptr.truncate(self.size)
+
+            def copyRun(first):
+                data = self._fetch(first, min(lastBlock, first + step - 1), store=False)
+                with lock:
+                    fptr.seek(first * self.blockSize)
+                    fptr.write(data)
+
+            with concurrent.futures.ThreadPoolExecutor(
+                    workers or self.pool.maxPerHost) as executor:
+                list(executor.map(copyRun, range(0, lastBlock + 1, step)))
+
+
+class DiskCache:
+    """
+    Local copies of remote files, so tile sources that need a filesystem
+    path can read them.  The least recently used files are removed to keep
+    the total under a size cap.
+    """
+
+    def __init__(self, path=DEFAULT_DISK_CACHE_DIR, maxSize=DEFAULT_DISK_CACHE_SIZE):
+        self.path = path
+        self.maxSize = maxSize
+        self._lock = threading.Lock()
+
+    def local_path(self, remote):
+        """
+        Get a local path for a remote file, downloading it if needed.
+
+        :param remote: an HttpFile.
+        :returns: the path of the local copy.
+        """
+        if remote.size > self.maxSize:
+            msg = f'{remote.url} is larger than the http disk cache'
+            raise OSError(msg)
+        key = hashlib.sha256(
+            f'{remote.url}\n{remote.version}\n{remote.size}'.encode()).hexdigest()
+        ext = os.path.splitext(urllib.parse.urlsplit(remote.url).path)[1][:16]
+        path = os.path.join(self.path, key + ext)
+        if os.path.isfile(path) and os.path.getsize(path) == remote.size:
+            os.utime(path)
+            return path
+        os.makedirs(self.path, exist_ok=True)
+        partial = f'{path}.{os.getpid()}.{threading.get_ident()}.part'
+        try:
+            remote.download(partial)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.unlink(partial)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.path):
+                if entry.name.endswith('.part') or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.maxSize:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.unlink(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+defaultDiskCache = DiskCache()
+
+
+def configure(cacheSize=None, blockSize=None, readAhead=None, diskCacheSize=None,
+              diskCacheDir=None):
+    """
+    Adjust the defaults used for subsequently opened http files.
+
+    :param cacheSize: maximum bytes kept in the shared block cache.
+    :param blockSize: the size of each cached block in bytes.
+    :param readAhead: the number of extra blocks to request past a miss.
+    :param diskCacheSize: maximum bytes of local copies of remote files.
+    :param diskCacheDir: the directory for local copies of remote files.
+    """
+    global DEFAULT_BLOCK_SIZE, DEFAULT_READ_AHEAD
+
+    if cacheSize is not None:
+        defaultCache.maxSize = cacheSize
+    if blockSize is not None:
+        DEFAULT_BLOCK_SIZE = blockSize
+    if readAhead is not None:
+        DEFAULT_READ_AHEAD = readAhead
+    if diskCacheSize is not None:
+        defaultDiskCache.maxSize = diskCacheSize
+    if diskCacheDir is not None:
+        defaultDiskCache.path = diskCacheDir
+
+
+def open_url(url):
+    return HttpFile(url, blockSize=DEFAULT_BLOCK_SIZE, readAhead=DEFAULT_READ_AHEAD)
+
@@ -0,0 +1,51 @@
+import zarr
+from large_image.cache_util import strhash
+from large_image_source_tifffile import TifffileFileTileSource
+
+
+class HttpTifffileTileSource(TifffileFileTileSource):
+    """
+    A tifffile tile source that reads from an HttpFile rather than a local
+    path, so only the parts of a remote file that are needed for the
+    requested tiles are fetched.
+    """
+
+    cacheName = 'tilesource'
+    name = 'tifffile_http'
+    extensions = {}
+    mimeTypes = {}
+
+    @staticmethod
+    def getLRUHash(*args, **kwargs):
+        remote = args[0]
+        # a changed remote file must not reuse the cached source
+        return strhash(f'{remote.url}\n{remote.version}\n{remote.size}',
+                       TifffileFileTileSource.getLRUHash(*args, **kwargs))
+
+    @property
+    def _largeImagePath(self):
+        # The base class opens tifffile with whatever this holds, and
+        # tifffile reads seekable streams as well as paths.
+        return self.largeImagePath
+
+    @_largeImagePath.setter
+    def _largeImagePath(self, value):
+        # the base class stores str(path), which would lose the stream
+        pass
+
+    def _checkForOmeBinaryonly(self):
+        # companion metadata files are only looked for next to local files
+        return
+
+    def _getZarrArray(self, series, sidx):
+        # The base class reads small single level images into memory whole,
+        # which for a remote file means downloading all of it.
+        with self._zarrlock:
+            if sidx not in self._zarrcache:
+                if len(self._zarrcache) > 10:
+                    self._zarrcache = {}
+                za = zarr.open(series.aszarr(), mode='r')
+                # a group holds one array per level; indexing a single array
+                # to find out would read a whole row of tiles
+                self._zarrcache[sidx] = (za, isinstance(za, zarr.Group))
+            return self._zarrcache[sidx]
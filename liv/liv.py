@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 
 import argparse
+import concurrent.futures
 import contextlib
 import copy
 import ctypes
+import functools
 import glob
+import io
 import json
 import logging
 import os
@@ -18,6 +21,13 @@ import large_image
 import numpy as np
 import PIL.Image
 import PIL.ImageOps
+import PIL.ImageStat
+
+try:
+    from . import dedupe, httpsource
+except ImportError:
+    import dedupe
+    import httpsource
 
 logger = logging.getLogger(__name__)
 
@@ -50,11 +60,39 @@ def start_server(sources, opts):
 
     @server.route('/metadata')
     def metadata():
-        return open_source(sources[0], opts).metadata
+        meta = dict(open_source(sources[0], opts).metadata)
+        # the frame tiles are served at when no frame is requested
+        meta['frame'] = max(opts.frame, 0)
+        return meta
 
     @server.route('/zxy/<z>/<x>/<y>')
     def getTile(z, x, y):
-        return open_source(sources[0], opts).getTile(int(x), int(y), int(z), frame=opts.frame)
+        frame = flask.request.args.get('frame', max(opts.frame, 0), type=int)
+        return open_source(sources[0], opts).getTile(int(x), int(y), int(z), frame=frame)
+
+    @functools.lru_cache(maxsize=16)
+    def cachedSprite(region, width, height):
+        img, columns = frame_sprite(
+            open_source(sources[0], opts), dict(region), width, height)
+        output = io.BytesIO()
+        img.save(output, 'JPEG', quality=85)
+        return output.getvalue(), columns
+
+    @server.route('/sprite')
+    def getSprite():
+        args = flask.request.args
+        width = min(max(args.get('width', SPRITE_MAX_CELL, type=int), 16), SPRITE_MAX_CELL)
+        height = min(max(args.get('height', SPRITE_MAX_CELL, type=int), 16), SPRITE_MAX_CELL)
+        metadata = open_source(sources[0], opts).metadata
+        region = sprite_region(
+            metadata, args.get('left', type=int), args.get('top', type=int),
+            args.get('right', type=int), args.get('bottom', type=int), max(width, height))
+        data, columns = cachedSprite(tuple(region.items()), width, height)
+        frames = min(max(1, len(metadata.get('frames', []))), SPRITE_MAX_FRAMES)
+        headers = {'X-Sprite-Columns': str(columns), 'X-Sprite-Frames': str(frames)}
+        headers.update({f'X-Sprite-{k.capitalize()}': str(v) for k, v in region.items()})
+        headers['Access-Control-Expose-Headers'] = ', '.join(headers)
+        return flask.Response(data, mimetype='image/jpeg', headers=headers)
 
     if not opts.port:
         opts.port = find_free_port()
@@ -140,9 +178,72 @@ def to_blocks(blocks, usecolor, x, vblocks):
     return out
 
 
+# aspect_ratio = 0.55 * 2
+CONSOLE_ASPECT_RATIO = 0.5 * 2
+
 # limit this size; maybe add locking at that point
 sourceCache = {}
 
+# a console render that is still running after its time budget ran out
+abandonedRender = None
+
+# bounds on the frame preview sprite sheets served to the web viewer
+SPRITE_MAX_CELL = 256
+SPRITE_MAX_SIZE = 4096
+SPRITE_MAX_FRAMES = 1024
+
+
+def open_source_path(path, opts, params):
+    if getattr(opts, 'usesource', None) is None and getattr(opts, 'skipsource', None) is None:
+        return large_image.open(path, **params)
+    if not len(large_image.tilesource.AvailableTileSources):
+        large_image.tilesource.loadTileSources()
+    sublist = {
+        k: v for k, v in large_image.tilesource.AvailableTileSources.items()
+        if (getattr(opts, 'skipsource', None) is None or k not in opts.skipsource) and
+           (getattr(opts, 'usesource', None) is None or k in opts.usesource)}
+    return large_image.tilesource.getTileSourceFromDict(sublist, path, **params)
+    """
+    canread = large_image.canReadList(path)
+    for src, couldread in canread:
+        if getattr(opts, 'skipsource', None) and src in opts.skipsource:
+            continue
+        if getattr(opts, 'usesource', None) and src not in opts.usesource:
+            continue
+        ts = large_image.tilesource.AvailableTileSources[src](path)
+    """
+
+
+def open_http_source(source, opts, params):
+    """
+    Open an http or https source.  Tiff files are read in place with range
+    requests through the shared block cache.  Other formats need a
+    filesystem path, so they are copied locally first, and if that fails the
+    url is passed to the tile sources as is.
+
+    :param source: the url.
+    :param opts: the command line options.
+    :param params: parameters for the tile source.
+    :returns: a tile source.
+    """
+    remote = httpsource.open_url(source)
+    if ((getattr(opts, 'skipsource', None) is None or 'tifffile' not in opts.skipsource) and
+            (getattr(opts, 'usesource', None) is None or 'tifffile' in opts.usesource)):
+        try:
+            try:
+                from .httptiff import HttpTifffileTileSource
+            except ImportError:
+                from httptiff import HttpTifffileTileSource
+            return HttpTifffileTileSource(remote, **params)
+        except Exception as exc:
+            logger.debug('Could not read %s with range requests (%s)', source, exc)
+    try:
+        path = httpsource.defaultDiskCache.local_path(remote)
+    except Exception as exc:
+        logger.warning('Could not cache %s locally (%s); reading it directly', source, exc)
+        path = source
+    return open_source_path(path, opts, params)
+
 
 # handle style, etc.
 def open_source(source, opts):
@@ -151,30 +252,79 @@ def open_source(source, opts):
         params['style'] = opts.style
     if source in sourceCache:
         return sourceCache[source]
-    if getattr(opts, 'usesource', None) is None and getattr(opts, 'skipsource', None) is None:
-        ts = large_image.open(source, **params)
+    if source.startswith(('https://', 'http://')) and not getattr(opts, 'no_http_cache', False):
+        ts = open_http_source(source, opts, params)
     else:
-        if not len(large_image.tilesource.AvailableTileSources):
-            large_image.tilesource.loadTileSources()
-        sublist = {
-            k: v for k, v in large_image.tilesource.AvailableTileSources.items()
-            if (getattr(opts, 'skipsource', None) is None or k not in opts.skipsource) and
-               (getattr(opts, 'usesource', None) is None or k in opts.usesource)}
-        ts = large_image.tilesource.getTileSourceFromDict(sublist, source, **params)
-        """
-        canread = large_image.canReadList(source)
-        for src, couldread in canread:
-            if getattr(opts, 'skipsource', None) and src in opts.skipsource:
-                continue
-            if getattr(opts, 'usesource', None) and src not in opts.usesource:
-                continue
-            ts = large_image.tilesource.AvailableTileSources[src](source)
-        """
+        ts = open_source_path(source, opts, params)
     sourceCache[source] = ts
     return ts
 
 
-def image_to_console(source, opts, assoc=None):
+def sprite_region(metadata, left, top, right, bottom, cell):
+    """
+    Expand a region to the tile grid of the level that a sprite cell of a
+    given size would be read from, so that nearby views share a sprite.
+
+    :param metadata: the tile source metadata.
+    :param left, top, right, bottom: the region in base pixels.  None is the
+        edge of the image.
+    :param cell: the maximum width and height of each frame's image.
+    :returns: a region dictionary with left, top, right, and bottom.
+    """
+    sizeX, sizeY = metadata['sizeX'], metadata['sizeY']
+    left = min(max(left or 0, 0), sizeX - 1)
+    top = min(max(top or 0, 0), sizeY - 1)
+    right = sizeX if right is None else min(max(right, left + 1), sizeX)
+    bottom = sizeY if bottom is None else min(max(bottom, top + 1), sizeY)
+    scale = 1
+    while (max(right - left, bottom - top) > cell * scale and
+           scale < 2 ** (metadata['levels'] - 1)):
+        scale *= 2
+    stepX = metadata['tileWidth'] * scale
+    stepY = metadata['tileHeight'] * scale
+    return {
+        'left': left // stepX * stepX,
+        'top': top // stepY * stepY,
+        'right': min(sizeX, -(-right // stepX) * stepX),
+        'bottom': min(sizeY, -(-bottom // stepY) * stepY),
+    }
+
+
+def frame_sprite(ts, region, width, height, maxFrames=SPRITE_MAX_FRAMES):
+    """
+    Make a grid of downsampled images of a region, one per frame, in frame
+    order.  The cells are shrunk as needed to keep the grid within
+    SPRITE_MAX_SIZE on a side.
+
+    :param ts: the tile source.
+    :param region: a region dictionary as used by getRegion.  Missing or None
+        values are the edges of the image.
+    :param width: the maximum width of each frame's image.
+    :param height: the maximum height of each frame's image.
+    :param maxFrames: only this many of the first frames are included.
+    :returns: a PIL image and the number of columns in the grid.
+    """
+    region = {k: v for k, v in region.items() if v is not None}
+    frames = min(max(1, len(ts.metadata.get('frames', []))), maxFrames)
+    columns = int(np.ceil(np.sqrt(frames)))
+    width = max(1, min(width, SPRITE_MAX_SIZE // columns))
+    height = max(1, min(height, SPRITE_MAX_SIZE // columns))
+
+    def getFrame(frame):
+        return ts.getRegion(
+            region=region, output={'maxWidth': width, 'maxHeight': height},
+            format=large_image.constants.TILE_FORMAT_PIL, frame=frame)[0].convert('RGB')
+
+    with concurrent.futures.ThreadPoolExecutor() as pool:
+        images = list(pool.map(getFrame, range(frames)))
+    cellw, cellh = images[0].size
+    sprite = PIL.Image.new('RGB', (cellw * columns, cellh * int(np.ceil(frames / columns))))
+    for idx, img in enumerate(images):
+        sprite.paste(img, ((idx % columns) * cellw, (idx // columns) * cellh))
+    return sprite, columns
+
+
+def console_thumbnail_size(opts):
     try:
         termw, termh = os.get_terminal_size()
         termh -= 2
@@ -187,13 +337,14 @@ def image_to_console(source, opts, assoc=None):
 
     width = termw * 2
     height = termh * 4
-    # aspect_ratio = 0.55 * 2
-    aspect_ratio = 0.5 * 2
-    color = opts.color
 
-    thumbw = width if aspect_ratio < 1 else int(width * aspect_ratio)
-    thumbh = height if aspect_ratio > 1 else int(height / aspect_ratio)
+    thumbw = width if CONSOLE_ASPECT_RATIO < 1 else int(width * CONSOLE_ASPECT_RATIO)
+    thumbh = height if CONSOLE_ASPECT_RATIO > 1 else int(height / CONSOLE_ASPECT_RATIO)
+    return thumbw, thumbh
+
 
+def image_to_console(source, opts, assoc=None):
+    thumbw, thumbh = console_thumbnail_size(opts)
     ts = open_source(source, opts)
     if not assoc:
         img = ts.getRegion(
@@ -204,6 +355,42 @@ def image_to_console(source, opts, assoc=None):
         img = ts.getAssociatedImage(
             assoc, width=thumbw, height=thumbh,
             format=large_image.constants.TILE_FORMAT_PIL)[0]
+    return pil_to_console(img, opts)
+
+
+def coarse_image_to_console(source, opts):
+    """
+    Quickly render an approximation of what image_to_console will produce
+    using an embedded thumbnail or a low resolution pyramid level.
+    """
+    thumbw, thumbh = console_thumbnail_size(opts)
+    ts = open_source(source, opts)
+    region = opts._view_params.get('region', {})
+    regionw = region.get('right', ts.sizeX) - region.get('left', 0)
+    regionh = region.get('bottom', ts.sizeY) - region.get('top', 0)
+    scale = min(1, thumbw / regionw, thumbh / regionh)
+    size = (max(1, int(round(regionw * scale))), max(1, int(round(regionh * scale))))
+    img = None
+    if not region and opts.frame <= 0 and 'thumbnail' in ts.getAssociatedImagesList():
+        img = ts.getAssociatedImage(
+            'thumbnail', width=thumbw // 4, height=thumbh // 4,
+            format=large_image.constants.TILE_FORMAT_PIL)[0]
+        # Some thumbnails also show a label or are padded; only use one that
+        # covers the same area as the image.
+        expected = img.width * regionh / regionw
+        if abs(img.height - expected) > max(1, expected * 0.05):
+            img = None
+    if img is None:
+        img = ts.getRegion(
+            format=large_image.constants.TILE_FORMAT_PIL,
+            output={'maxWidth': max(1, thumbw // 4), 'maxHeight': max(1, thumbh // 4)},
+            frame=max(opts.frame, 0), **opts._view_params)[0]
+    return pil_to_console(img.resize(size), opts, check_blank=False)
+
+
+def pil_to_console(img, opts, check_blank=True):
+    aspect_ratio = CONSOLE_ASPECT_RATIO
+    color = opts.color
     thumbw, thumbh = img.size
 
     if aspect_ratio < 1:
@@ -215,7 +402,7 @@ def image_to_console(source, opts, assoc=None):
         dotw, doth = dotw * 2, doth * 2
 
     img = img.convert('RGB')
-    if opts.skip_blank and len({v for b in img.getextrema() for v in b}) == 1:
+    if check_blank and opts.skip_blank and len({v for b in img.getextrema() for v in b}) == 1:
         raise Exception('Image is blank')
     adjimg = PIL.ImageOps.autocontrast(img, cutoff=0.02)
     # adjimg = PIL.ImageOps.equalize(img)
@@ -249,6 +436,33 @@ def image_to_console(source, opts, assoc=None):
     return output
 
 
+def probe_source(source, opts):
+    """
+    Read a tiny thumbnail of a source and raise an exception if it should be
+    skipped as blank or as a near duplicate of a source already shown.
+
+    :returns: the perceptual hash of the probe if deduplicating, otherwise
+        None.  The caller adds this to the index once the source is shown.
+    """
+    ts = open_source(source, opts)
+    img = ts.getRegion(
+        format=large_image.constants.TILE_FORMAT_PIL,
+        output={'maxWidth': opts.probe_size, 'maxHeight': opts.probe_size},
+        frame=max(opts.frame, 0), **opts._view_params)[0].convert('RGB')
+    if opts.skip_blank and max(PIL.ImageStat.Stat(img).stddev) <= opts.blank_threshold:
+        raise Exception('Image is blank')
+    if opts.dedupe:
+        if getattr(opts, '_dedupe_index', None) is None:
+            opts._dedupe_index = dedupe.HashIndex(opts.dedupe_distance)
+        value = dedupe.dhash(img)
+        match = opts._dedupe_index.find(value)
+        if match is not None and match != source:
+            msg = f'Image is a near duplicate of {match}'
+            raise Exception(msg)
+        return value
+    return None
+
+
 def show_metadata(source, opts):
     ts = open_source(source, opts)
     meta = ts.metadata.copy()
@@ -256,6 +470,71 @@ def show_metadata(source, opts):
     sys.stdout.write(pprint.pformat(meta).strip() + '\n')
 
 
+def write_console(source, opts):
+    """
+    Write an image to the console.  On a terminal, a coarse version is drawn
+    first and replaced when the full image is ready.  If there is a time
+    budget and the full image isn't ready in time, the coarse version is
+    kept.  At most one full render is left running past its budget.
+    """
+    progressive = opts.progressive and sys.stdout.isatty()
+    if not progressive and not opts.time_budget:
+        result = image_to_console(source, opts)
+        for line in result.split('\n'):
+            sys.stdout.write(line + '\n')
+        return
+    global abandonedRender
+
+    start = time.time()
+    open_source(source, opts)
+    if abandonedRender is not None:
+        # Don't start another full render while one that ran out of time is
+        # still reading; let it finish within this file's budget, otherwise
+        # only draw the coarse image.
+        abandonedRender.join(max(0, start + opts.time_budget - time.time()))
+        if abandonedRender.is_alive():
+            sys.stdout.write(coarse_image_to_console(source, opts) + '\n')
+            return
+        abandonedRender = None
+    full = {}
+
+    def render():
+        try:
+            full['result'] = image_to_console(source, opts)
+        except Exception as exc:
+            full['error'] = exc
+
+    # a daemon thread so an abandoned render doesn't delay exiting
+    thread = threading.Thread(target=render, daemon=True)
+    thread.start()
+    coarse = None
+    try:
+        coarse = coarse_image_to_console(source, opts)
+    except Exception:
+        logger.debug('Could not render a coarse image', exc_info=True)
+    if coarse is not None and progressive and thread.is_alive():
+        sys.stdout.write(coarse + '\n')
+        sys.stdout.flush()
+    else:
+        progressive = False
+    thread.join(max(0, start + opts.time_budget - time.time()) if opts.time_budget else None)
+    if progressive and not thread.is_alive():
+        # move to the start of the coarse image and clear it
+        sys.stdout.write(f'\033[{coarse.count(chr(10)) + 1}A\r\033[J')
+    if 'error' in full:
+        raise full['error']
+    if thread.is_alive():
+        if coarse is None:
+            msg = 'Image could not be rendered in the time budget'
+            raise Exception(msg)
+        if not progressive:
+            sys.stdout.write(coarse + '\n')
+        abandonedRender = thread
+        return
+    for line in full['result'].split('\n'):
+        sys.stdout.write(line + '\n')
+
+
 def show_console(sources, opts):
     try:
         kernel32 = ctypes.windll.kernel32
@@ -263,6 +542,14 @@ def show_console(sources, opts):
     except Exception:
         pass
     for source in sources:
+        probeHash = None
+        if opts.skip_blank or opts.dedupe:
+            try:
+                probeHash = probe_source(source, opts)
+            except Exception:
+                if opts.verbose - opts.silent >= 3:
+                    logger.exception('Skipping source')
+                continue
         sys.stdout.write(f'{source}\n')
         try:
             if opts.metadata:
@@ -273,15 +560,11 @@ def show_console(sources, opts):
                         ts.frames if opts.frame == -1 else min(ts.frames, -opts.frame)):
                     subopts = copy.copy(opts)
                     subopts.frame = frame
-                    result = image_to_console(source, subopts)
                     if ts.frames > 1:
                         sys.stdout.write(f'Frame {frame}\n')
-                    for line in result.split('\n'):
-                        sys.stdout.write(line + '\n')
+                    write_console(source, subopts)
             else:
-                result = image_to_console(source, opts)
-                for line in result.split('\n'):
-                    sys.stdout.write(line + '\n')
+                write_console(source, opts)
             if opts.associated:
                 spec = opts.associated
                 ts = open_source(source, opts)
@@ -294,11 +577,42 @@ def show_console(sources, opts):
                         for line in result.split('\n'):
                             sys.stdout.write(line + '\n')
             # sys.stdout.write(result + '\n')
+            if probeHash is not None:
+                opts._dedupe_index.add(probeHash, source)
         except Exception:
             if opts.verbose - opts.silent >= 3:
                 logger.exception('Could not open source')
 
 
+def watch_console(sources, opts):
+    """
+    Show sources in the console as they are added or changed.
+
+    :param sources: the sources that were already shown.  Local files are
+        normalized paths, as the watcher reports them.
+    :param opts: the command line options.
+    """
+    try:
+        from . import watch
+    except ImportError:
+        import watch
+
+    def render(changed, removed):
+        for source in changed + removed:
+            sourceCache.pop(source, None)
+            if getattr(opts, '_dedupe_index', None) is not None:
+                opts._dedupe_index.remove(source)
+        show_console(changed, opts)
+        sys.stdout.flush()
+
+    sys.stdout.flush()
+    known = {source: watch.file_signature(source)
+             for source in sources if not source.startswith(('https://', 'http://'))}
+    watch.watch_sources(
+        opts.source, known, render, settle=opts.settle, poll=opts.poll,
+        useInotify=not opts.no_inotify)
+
+
 def main(opts):
     large_image.tilesource.loadTileSources()
     if opts.all:
@@ -307,6 +621,20 @@ def main(opts):
                 del large_image.config.ConfigValues[key]
         large_image.config.ConfigValues.pop('all_sources_ignored_names', None)
     sources = get_sources(opts.source)
+    if opts.export:
+        try:
+            from . import export
+        except ImportError:
+            import export
+
+        export.export_sources(sources, opts)
+        return
+    if opts.watch:
+        opts.console = True
+        # changes are reported by normalized path, so use the same keys for
+        # the source cache and dedupe index from the start
+        sources = [source if source.startswith(('https://', 'http://')) else
+                   os.path.normpath(source) for source in sources]
     if not opts.console and not opts.web and opts.port:
         opts.web = True
     if not opts.console:
@@ -319,6 +647,8 @@ def main(opts):
             opts.console = True
     if opts.console:
         show_console(sources, opts)
+        if opts.watch:
+            watch_console(sources, opts)
         return
     url = start_server(sources, opts)
     if not opts.web:
@@ -405,7 +735,51 @@ def command():
     parser.add_argument(
         '--skip-blank', action='store_true',
         help='If an image is all the same color, do not show it in the '
-        'console.')
+        'console.  A small probe image is checked first so that nearly '
+        'uniform images are skipped before they are fully read.')
+    parser.add_argument(
+        '--blank-threshold', type=float, default=2,
+        help='With --skip-blank, the largest standard deviation of any band '
+        'of the probe image for it to be considered blank.')
+    parser.add_argument(
+        '--dedupe', action='store_true',
+        help='Do not show images in the console that look like ones that '
+        'were already shown, based on a perceptual hash of a small probe '
+        'image.')
+    parser.add_argument(
+        '--dedupe-distance', type=int, default=4,
+        help='With --dedupe, the maximum number of differing bits in the '
+        '64-bit hash for images to be considered duplicates.')
+    parser.add_argument(
+        '--probe-size', type=int, default=32,
+        help='The maximum width and height of the probe image used for '
+        '--skip-blank and --dedupe.')
+    parser.add_argument(
+        '--progressive', action='store_true', default=True,
+        help='On a terminal, draw a coarse image right away and replace it '
+        'when the full image is ready.')
+    parser.add_argument(
+        '--no-progressive', action='store_false', dest='progressive',
+        help='Only draw the full image.')
+    parser.add_argument(
+        '--time-budget', type=float,
+        help='Seconds to wait for the full image of each file before keeping '
+        'the coarse image instead.')
+    parser.add_argument(
+        '--watch', action='store_true',
+        help='After showing the sources in the console, keep watching them '
+        'and show files that are added or modified.')
+    parser.add_argument(
+        '--settle', type=float, default=2,
+        help='When watching, the number of seconds a file must be unchanged '
+        'before it is shown.')
+    parser.add_argument(
+        '--poll', type=float, default=5,
+        help='When watching without inotify, the number of seconds between '
+        'scans.')
+    parser.add_argument(
+        '--no-inotify', action='store_true',
+        help='When watching, poll for changes rather than using inotify.')
     parser.add_argument(
         '--frame', type=int, default=0,
         help='View a specific frame.  Use -1 to show all frames in turn.  Use '
@@ -427,6 +801,52 @@ def command():
     parser.add_argument(
         '--style', help='Add a json style.')
 
+    parser.add_argument(
+        '--http-memory-cache', type=float, default=256,
+        help='Maximum size in megabytes of the blocks of http and https '
+        'sources kept in memory.')
+    parser.add_argument(
+        '--http-cache', type=float, default=4096,
+        help='Maximum size in megabytes of the local copies kept of http and '
+        'https sources that cannot be read with range requests, such as '
+        'non-tiff formats.  Larger sources are read directly.')
+    parser.add_argument(
+        '--http-cache-dir',
+        help='Directory for local copies of http and https sources.  Defaults '
+        'to a directory in the system temporary directory.')
+    parser.add_argument(
+        '--http-block', type=int, default=256,
+        help='Size in kilobytes of each block read from http and https '
+        'sources.')
+    parser.add_argument(
+        '--http-read-ahead', type=int, default=4,
+        help='Number of extra blocks to read in each http range request.')
+    parser.add_argument(
+        '--no-http-cache', action='store_true',
+        help='Pass http and https sources directly to the tile sources rather '
+        'than reading them through the block and local caches.')
+
+    parser.add_argument(
+        '--export',
+        help='Write the tile pyramid, metadata, and web viewer to this '
+        'directory so it can be served by any static file server.  If there '
+        'are multiple sources, each is written to a subdirectory based on its '
+        'path relative to the other sources.  An interrupted export resumes '
+        'where it stopped.')
+    parser.add_argument(
+        '--export-format', choices=('files', 'archive'), default='files',
+        help='Export tiles as individual zxy/{z}/{x}/{y} files or as a single '
+        'archive file with an index of offsets.  Archives require a server '
+        'that supports range requests.')
+    parser.add_argument(
+        '--export-workers', type=int,
+        help='Number of processes used to export tiles.  Defaults to the '
+        'number of cpus.')
+    parser.add_argument(
+        '--export-keep-blank', action='store_true',
+        help='Export tiles that are fully transparent rather than skipping '
+        'them.')
+
     parser.add_argument(
         '--host', default='127.0.0.1',
         help='Bind the server to an address.  Use 0.0.0.0 for all.')
@@ -453,6 +873,12 @@ def command():
         bbox = [int(val) for val in opts.bbox.split(',')]
         opts._view_params['region'] = {
             'left': bbox[0], 'top': bbox[1], 'right': bbox[2], 'bottom': bbox[3]}
+    httpsource.configure(
+        cacheSize=int(opts.http_memory_cache * 1024 ** 2),
+        blockSize=opts.http_block * 1024,
+        readAhead=opts.http_read_ahead,
+        diskCacheSize=int(opts.http_cache * 1024 ** 2),
+        diskCacheDir=opts.http_cache_dir)
     main(opts)
 
 
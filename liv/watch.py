@@ -0,0 +1,273 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import glob
+import logging
+import os
+import select
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def glob_match(path, pattern):
+    # glob.glob doesn't match path separators with wildcards, so compare
+    # component by component.
+    pathParts = os.path.normpath(path).split(os.sep)
+    patternParts = os.path.normpath(pattern).split(os.sep)
+    return len(pathParts) == len(patternParts) and all(
+        fnmatch.fnmatchcase(part, pat) for part, pat in zip(pathParts, patternParts))
+
+
+def source_matches(path, sourceList):
+    """
+    Determine if a local file would be included by get_sources for a list of
+    source specifications without walking any directories.
+    """
+    included = False
+    npath = os.path.normpath(path)
+    for source in sourceList:
+        if source.startswith(('https://', 'http://')):
+            continue
+        remove = source.startswith('-') and not os.path.exists(source)
+        spec = source[1:] if remove else source
+        nspec = os.path.normpath(spec)
+        if os.path.isdir(spec):
+            match = npath.startswith(nspec.rstrip(os.sep) + os.sep)
+        elif glob.has_magic(spec):
+            match = glob_match(npath, nspec)
+        else:
+            match = npath == nspec
+        if match:
+            included = not remove
+    return included
+
+
+def watch_roots(sourceList):
+    """
+    Find the directories to watch for a list of source specifications.
+
+    :param sourceList: the source specifications as passed to get_sources.
+    :returns: a sorted list of (directory, recursive) tuples.  Directories
+        and glob patterns are watched recursively; for a single file, only
+        its own directory is watched.
+    """
+    roots = {}
+    for source in sourceList:
+        if source.startswith(('-', 'https://', 'http://')):
+            continue
+        if os.path.isdir(source):
+            roots[os.path.normpath(source)] = True
+        elif os.path.isfile(source):
+            root = os.path.dirname(os.path.normpath(source)) or '.'
+            roots[root] = roots.get(root, False)
+        elif glob.has_magic(source):
+            parts = source.split(os.sep)
+            prefix = []
+            while parts and not glob.has_magic(parts[0]):
+                prefix.append(parts.pop(0))
+            root = os.sep.join(prefix) or ('.' if not source.startswith(os.sep) else os.sep)
+            if os.path.isdir(root):
+                roots[os.path.normpath(root)] = True
+    return sorted(roots.items())
+
+
+class Inotify:
+    """
+    A minimal recursive inotify wrapper using ctypes.  Construction raises
+    OSError where inotify is not available.
+    """
+
+    def __init__(self):
+        libname = ctypes.util.find_library('c')
+        if not libname:
+            msg = 'libc is not available'
+            raise OSError(msg)
+        self._libc = ctypes.CDLL(libname, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            msg = 'inotify is not available'
+            raise OSError(msg)
+        self.fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._dirs = {}
+        self._recursive = set()
+
+    def add_tree(self, root):
+        """
+        Watch a directory and all of its subdirectories.
+
+        :param root: the directory to watch.
+        :returns: a list of the files found while adding the watches.
+        """
+        files = []
+        for dirpath, _dirs, filenames in os.walk(root):
+            self.add(dirpath, recursive=True)
+            files.extend(os.path.join(dirpath, file) for file in filenames)
+        return files
+
+    def add(self, path, recursive=False):
+        """
+        Watch a single directory.
+
+        :param path: the directory to watch.
+        :param recursive: True if subdirectories created in it should be
+            watched, too.
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            logger.debug('Cannot watch %s (errno %d)', path, ctypes.get_errno())
+            return
+        self._dirs[wd] = path
+        if recursive:
+            self._recursive.add(path)
+
+    def is_recursive(self, path):
+        return path in self._recursive
+
+    def read(self, timeout=None):
+        """
+        Wait for events.
+
+        :param timeout: maximum seconds to wait or None to wait indefinitely.
+        :returns: a list of (path, mask) tuples.  A path of None with
+            IN_Q_OVERFLOW means events were lost.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        buf = os.read(self.fd, 65536)
+        events = []
+        pos = 0
+        while pos + EVENT_HEADER.size <= len(buf):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(buf, pos)
+            pos += EVENT_HEADER.size
+            name = os.fsdecode(buf[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, mask))
+                continue
+            if mask & IN_IGNORED:
+                self._recursive.discard(self._dirs.pop(wd, None))
+                continue
+            if wd in self._dirs:
+                events.append((os.path.join(self._dirs[wd], name) if name else
+                               self._dirs[wd], mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def watch_sources(sourceList, known, callback, settle=2, poll=5, useInotify=True):
+    """
+    Watch for added or modified sources and report them once they have
+    settled.  This does not return.
+
+    :param sourceList: the source specifications as passed to get_sources.
+    :param known: a dictionary of normalized paths that have already been
+        handled to their file signatures.  This is updated in place.
+    :param callback: a function called with a sorted list of paths that are
+        new or changed, and a list of paths that were removed.
+    :param settle: seconds a file's size and modification time must be
+        unchanged before it is reported.
+    :param poll: seconds between scans when inotify is not available.
+    :param useInotify: False to always poll.
+    """
+    # importing here avoids a circular import
+    try:
+        from .liv import get_sources
+    except ImportError:
+        from liv import get_sources
+
+    notify = None
+    if useInotify:
+        try:
+            notify = Inotify()
+            for root, recursive in watch_roots(sourceList):
+                if recursive:
+                    notify.add_tree(root)
+                else:
+                    notify.add(root)
+        except OSError:
+            logger.info('inotify is unavailable; polling for changes')
+            notify = None
+    pending = {}
+    lastScan = time.monotonic()
+    while True:
+        now = time.monotonic()
+        if pending:
+            timeout = max(0, min(entry[1] for entry in pending.values()) + settle - now)
+        else:
+            timeout = None
+        if notify is None:
+            timeout = poll if timeout is None else min(timeout, poll)
+        candidates = set()
+        removed = []
+        if notify is not None:
+            for path, mask in notify.read(timeout):
+                if path is None:
+                    candidates |= {os.path.normpath(file) for file in get_sources(sourceList)}
+                    candidates |= set(known)
+                elif mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    if notify.is_recursive(os.path.dirname(path)):
+                        candidates |= {os.path.normpath(file) for file in notify.add_tree(path)}
+                elif not mask & IN_ISDIR:
+                    candidates.add(os.path.normpath(path))
+        else:
+            time.sleep(timeout)
+            if time.monotonic() - lastScan >= poll:
+                lastScan = time.monotonic()
+                candidates |= {os.path.normpath(file) for file in get_sources(sourceList)}
+                candidates |= set(known)
+        now = time.monotonic()
+        for path in candidates:
+            sig = file_signature(path)
+            if sig is None or not source_matches(path, sourceList):
+                pending.pop(path, None)
+                if known.pop(path, None) is not None:
+                    removed.append(path)
+            elif known.get(path) != sig and pending.get(path, (None,))[0] != sig:
+                pending[path] = (sig, now)
+        ready = []
+        for path, (sig, seen) in list(pending.items()):
+            if now - seen < settle:
+                continue
+            current = file_signature(path)
+            if current != sig:
+                if current is None:
+                    del pending[path]
+                else:
+                    pending[path] = (current, now)
+                continue
+            del pending[path]
+            known[path] = sig
+            ready.append(path)
+        if ready or removed:
+            callback(sorted(ready), sorted(removed))
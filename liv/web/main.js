@@ -9,7 +9,22 @@
     '#map', tileinfo.sizeX, tileinfo.sizeY, tileinfo.tileWidth, tileinfo.tileHeight);
   const map = geo.map(params.map);
   params.layer.url = `${imageServer}/zxy/{z}/{x}/{y}`;
+  let archiveIndex;
+  if (tileinfo.tileArchive) {
+    // A static export packed into one file; tile urls are keys in the index
+    archiveIndex = await fetch(
+      `${imageServer}/${tileinfo.tileArchive.index}`
+    ).then(response => response.json());
+    params.layer.url = '{z}/{x}/{y}';
+  }
   const layer = map.createLayer('osm', params.layer);
+  if (archiveIndex) {
+    useTileArchive(layer, `${imageServer}/${tileinfo.tileArchive.data}`, archiveIndex);
+  }
+  // static exports only contain a single frame
+  if ((tileinfo.frames || []).length > 1 && tileinfo.exportedFrame === undefined) {
+    frameSlider(map, layer, imageServer, tileinfo);
+  }
 
   map.geoOn(geo.event.mousemove, function (evt) {
     $('#info').text('x: ' + evt.geo.x.toFixed(6) + ', y: ' + evt.geo.y.toFixed(6));
@@ -17,3 +32,182 @@
 
   return null;
 })();
+
+/**
+ * Load tiles from byte ranges of a single archive file rather than from
+ * individual urls.
+ *
+ * @param {geo.tileLayer} layer The layer to modify.
+ * @param {string} dataUrl The url of the archive data.
+ * @param {object} index A map of '{z}/{x}/{y}' to [offset, length].
+ */
+function useTileArchive(layer, dataUrl, index) {
+  const getTile = layer._getTile;
+  layer._getTile = function (tileIndex, source) {
+    const tile = getTile.call(layer, tileIndex, source);
+    tile.fetch = function () {
+      if (!this._image) {
+        const defer = geo.jQuery.Deferred();
+        const entry = index[this._url];
+        this._image = new Image(this.right - this.left, this.bottom - this.top);
+        this._image.onload = () => {
+          URL.revokeObjectURL(this._image.src);
+          defer.resolve();
+        };
+        this._image.onerror = defer.reject;
+        if (!entry) {
+          // blank tiles are not stored
+          defer.reject();
+        } else {
+          const [offset, length] = entry;
+          fetch(dataUrl, {headers: {Range: `bytes=${offset}-${offset + length - 1}`}})
+            .then(response => {
+              // a server that ignores Range would send the whole archive
+              if (response.status !== 206) {
+                throw new Error(`${dataUrl} does not support range requests`);
+              }
+              return response.blob();
+            })
+            .then(blob => {
+              this._image.src = URL.createObjectURL(blob);
+            })
+            .catch(defer.reject);
+        }
+        defer.done(() => { this._fetched = true; }).promise(this);
+      }
+      return this;
+    };
+    return tile;
+  };
+  layer.reset();
+  layer.map().draw();
+}
+
+/**
+ * Show a slider to change frames.  While the slider moves, a preview of each
+ * frame is drawn from a sprite sheet of the current view; once it settles,
+ * full resolution tiles are loaded for the selected frame.
+ *
+ * @param {geo.map} map The map.
+ * @param {geo.tileLayer} layer The tile layer.
+ * @param {string} imageServer The base url of the server.
+ * @param {object} tileinfo The image metadata.
+ */
+function frameSlider(map, layer, imageServer, tileinfo) {
+  const count = tileinfo.frames.length;
+  const slider = document.getElementById('frame');
+  const label = document.getElementById('frame-label');
+  const preview = document.getElementById('preview');
+  // keep the whole sprite sheet to around 4096 pixels on a side
+  const cellSize = Math.max(32, Math.min(256, Math.floor(4096 / Math.ceil(Math.sqrt(count)))));
+  let sprite, spriteKey, settleTimer;
+
+  slider.max = count - 1;
+  // start where the server's default tiles are
+  slider.value = tileinfo.frame || 0;
+  let tilesFrame = +slider.value;
+  label.textContent = `Frame ${slider.value}`;
+  document.getElementById('frames').style.display = 'block';
+
+  const viewRegion = () => {
+    const bounds = map.bounds(undefined, null);
+    return {
+      left: Math.max(0, Math.floor(Math.min(bounds.left, bounds.right))),
+      top: Math.max(0, Math.floor(Math.min(bounds.top, bounds.bottom))),
+      right: Math.min(tileinfo.sizeX, Math.ceil(Math.max(bounds.left, bounds.right))),
+      bottom: Math.min(tileinfo.sizeY, Math.ceil(Math.max(bounds.top, bounds.bottom)))
+    };
+  };
+
+  const loadSprite = async () => {
+    const region = viewRegion();
+    const key = JSON.stringify(region);
+    if (key === spriteKey) {
+      return;
+    }
+    spriteKey = key;
+    sprite = undefined;
+    let response, image;
+    try {
+      response = await fetch(
+        `${imageServer}/sprite?left=${region.left}&top=${region.top}` +
+        `&right=${region.right}&bottom=${region.bottom}&width=${cellSize}&height=${cellSize}`);
+      if (!response.ok) {
+        throw new Error(`sprite request failed with status ${response.status}`);
+      }
+      image = await createImageBitmap(await response.blob());
+    } catch (err) {
+      // without a preview, the slider still loads tiles once it settles
+      console.warn(err);
+      return;
+    }
+    if (spriteKey === key) {
+      const header = (name) => +response.headers.get(`X-Sprite-${name}`);
+      const columns = header('Columns');
+      const frames = header('Frames');
+      sprite = {
+        image: image,
+        // the server expands the region to its tile grid
+        region: {
+          left: header('Left'),
+          top: header('Top'),
+          right: header('Right'),
+          bottom: header('Bottom')
+        },
+        columns: columns,
+        frames: frames,
+        width: image.width / columns,
+        height: image.height / Math.ceil(frames / columns)
+      };
+    }
+  };
+
+  const drawPreview = (frame) => {
+    if (!sprite) {
+      return;
+    }
+    if (frame >= sprite.frames) {
+      // very long series only have previews of their first frames
+      preview.style.display = 'none';
+      return;
+    }
+    const size = map.size();
+    const topLeft = map.gcsToDisplay({x: sprite.region.left, y: sprite.region.top}, null);
+    const bottomRight = map.gcsToDisplay(
+      {x: sprite.region.right, y: sprite.region.bottom}, null);
+    preview.width = size.width;
+    preview.height = size.height;
+    const ctx = preview.getContext('2d');
+    ctx.clearRect(0, 0, size.width, size.height);
+    ctx.drawImage(
+      sprite.image,
+      (frame % sprite.columns) * sprite.width, Math.floor(frame / sprite.columns) * sprite.height,
+      sprite.width, sprite.height,
+      topLeft.x, topLeft.y, bottomRight.x - topLeft.x, bottomRight.y - topLeft.y);
+    preview.style.display = 'block';
+  };
+
+  const showFrame = (frame) => {
+    layer.url(`${imageServer}/zxy/{z}/{x}/{y}?frame=${frame}`);
+    layer.onIdle(() => {
+      tilesFrame = frame;
+      if (+slider.value === frame) {
+        preview.style.display = 'none';
+      }
+    });
+  };
+
+  slider.addEventListener('input', () => {
+    const frame = +slider.value;
+    label.textContent = `Frame ${frame}`;
+    loadSprite().then(() => {
+      if (+slider.value !== tilesFrame) {
+        drawPreview(+slider.value);
+      }
+    });
+    clearTimeout(settleTimer);
+    settleTimer = setTimeout(() => showFrame(frame), 300);
+  });
+  // the preview only matches the view it was drawn for
+  map.geoOn(geo.event.pan, () => { preview.style.display = 'none'; });
+}
@@ -0,0 +1,164 @@
+import argparse
+import io
+import sys
+import threading
+
+import numpy as np
+import PIL.Image
+import pytest
+
+large_image = pytest.importorskip('large_image')
+tifffile = pytest.importorskip('tifffile')
+
+from liv import liv  # noqa: E402
+
+
+def make_opts(**kwargs):
+    opts = argparse.Namespace(
+        width=40, height=10, color=True, contrast=0.25, skip_blank=False,
+        blank_threshold=2, dedupe=True, dedupe_distance=4, probe_size=32,
+        frame=0, associated=None, metadata=False, progressive=False,
+        time_budget=None, style=None, usesource=None, skipsource=None,
+        verbose=0, silent=0, _view_params={})
+    for key, value in kwargs.items():
+        setattr(opts, key, value)
+    return opts
+
+
+def write_copies(tmp_path, count):
+    image = np.random.default_rng(0).integers(0, 255, (400, 600, 3), dtype=np.uint8)
+    paths = []
+    for idx in range(count):
+        paths.append(str(tmp_path / f'{idx}.tiff'))
+        tifffile.imwrite(paths[-1], image, tile=(256, 256), photometric='rgb')
+    return paths
+
+
+def test_dedupe(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(liv, 'sourceCache', {})
+    sources = write_copies(tmp_path, 2)
+    liv.show_console(sources, make_opts())
+    out = capsys.readouterr().out
+    assert sources[0] in out
+    assert sources[1] not in out
+
+
+def test_dedupe_after_failed_render(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(liv, 'sourceCache', {})
+    sources = write_copies(tmp_path, 2)
+    write_console = liv.write_console
+
+    def failFirst(source, opts):
+        if source == sources[0]:
+            msg = 'read error'
+            raise Exception(msg)
+        return write_console(source, opts)
+
+    monkeypatch.setattr(liv, 'write_console', failFirst)
+    liv.show_console(sources, make_opts())
+    # the first image was never shown, so the second isn't a duplicate of it
+    assert sources[1] in capsys.readouterr().out
+
+
+class TtyOutput(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def tty_output(monkeypatch):
+    # set while the test runs, as output capturing replaces stdout after
+    # fixtures are set up
+    out = TtyOutput()
+    monkeypatch.setattr(sys, 'stdout', out)
+    return out
+
+
+@pytest.fixture
+def slow_render(monkeypatch):
+    """
+    Replace the full console render with one that waits until released and
+    counts how often it was started.
+    """
+    monkeypatch.setattr(liv, 'sourceCache', {})
+    monkeypatch.setattr(liv, 'abandonedRender', None)
+    state = {'calls': 0, 'release': threading.Event()}
+
+    def image_to_console(source, opts, assoc=None):
+        state['calls'] += 1
+        state['release'].wait(10)
+        return 'full 1\nfull 2'
+
+    monkeypatch.setattr(liv, 'image_to_console', image_to_console)
+    yield state
+    state['release'].set()
+    if liv.abandonedRender is not None:
+        liv.abandonedRender.join()
+
+
+def test_write_console_redraws_in_place(tmp_path, slow_render, monkeypatch):
+    source = write_copies(tmp_path, 1)[0]
+    opts = make_opts(progressive=True)
+    coarse = liv.coarse_image_to_console(source, opts)
+    out = tty_output(monkeypatch)
+    threading.Timer(0.2, slow_render['release'].set).start()
+    liv.write_console(source, opts)
+    lines = coarse.count('\n') + 1
+    assert out.getvalue() == (
+        f'{coarse}\n\033[{lines}A\r\033[Jfull 1\nfull 2\n')
+
+
+def test_write_console_keeps_coarse(tmp_path, slow_render, monkeypatch):
+    source = write_copies(tmp_path, 1)[0]
+    opts = make_opts(progressive=True, time_budget=0.2)
+    coarse = liv.coarse_image_to_console(source, opts)
+    out = tty_output(monkeypatch)
+    liv.write_console(source, opts)
+    assert out.getvalue() == coarse + '\n'
+    assert liv.abandonedRender.is_alive()
+
+
+def test_write_console_one_abandoned_render(tmp_path, slow_render, monkeypatch):
+    sources = write_copies(tmp_path, 2)
+    opts = make_opts(progressive=True, time_budget=0.2)
+    coarse = liv.coarse_image_to_console(sources[1], opts)
+    out = tty_output(monkeypatch)
+    liv.write_console(sources[0], opts)
+    abandoned = liv.abandonedRender
+    out.seek(0)
+    out.truncate()
+    liv.write_console(sources[1], opts)
+    # the second file only gets a coarse image while the first still renders
+    assert slow_render['calls'] == 1
+    assert out.getvalue() == coarse + '\n'
+    assert liv.abandonedRender is abandoned
+    slow_render['release'].set()
+    abandoned.join()
+    liv.write_console(sources[1], opts)
+    assert slow_render['calls'] == 2
+
+
+def test_coarse_thumbnail_aspect(tmp_path, monkeypatch):
+    monkeypatch.setattr(liv, 'sourceCache', {})
+    source = write_copies(tmp_path, 1)[0]
+    opts = make_opts()
+    ts = liv.open_source(source, opts)
+    expected = liv.coarse_image_to_console(source, opts)
+    # a thumbnail of a different shape, such as one with a label, is ignored
+    monkeypatch.setattr(ts, 'getAssociatedImagesList', lambda: ['thumbnail'])
+    monkeypatch.setattr(ts, 'getAssociatedImage', lambda *args, **kwargs: (
+        PIL.Image.new('RGB', (20, 20), (255, 0, 0)), None))
+    assert liv.coarse_image_to_console(source, opts) == expected
+
+
+def test_skip_near_uniform(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(liv, 'sourceCache', {})
+    # faint noise on a flat background, as from an empty scan
+    image = np.random.default_rng(0).integers(200, 202, (400, 600, 3), dtype=np.uint8)
+    blank = str(tmp_path / 'blank.tiff')
+    tifffile.imwrite(blank, image, tile=(256, 256), photometric='rgb')
+    source = write_copies(tmp_path, 1)[0]
+    written = []
+    monkeypatch.setattr(liv, 'write_console', lambda source, opts: written.append(source))
+    liv.show_console([blank, source], make_opts(skip_blank=True, dedupe=False))
+    assert written == [source]
+    assert blank not in capsys.readouterr().out
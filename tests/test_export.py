@@ -0,0 +1,76 @@
+import argparse
+import json
+
+import numpy as np
+import pytest
+
+large_image = pytest.importorskip('large_image')
+tifffile = pytest.importorskip('tifffile')
+
+from liv import export  # noqa: E402
+
+
+def make_opts(path, **kwargs):
+    opts = argparse.Namespace(
+        export=str(path), export_format='files', export_workers=2,
+        export_keep_blank=False, frame=0, style=None, usesource=None,
+        skipsource=None)
+    for key, value in kwargs.items():
+        setattr(opts, key, value)
+    return opts
+
+
+def write_image(path, width, height, value=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if value is None:
+        image = np.random.default_rng(width).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    else:
+        image = np.full((height, width, 3), value, dtype=np.uint8)
+    tifffile.imwrite(path, image, tile=(256, 256), photometric='rgb')
+    return str(path)
+
+
+def test_export_same_names(tmp_path):
+    sources = [write_image(tmp_path / 'a' / 'x.tiff', 1500, 1000),
+               write_image(tmp_path / 'b' / 'x.tiff', 900, 600)]
+    export.export_sources(sources, make_opts(tmp_path / 'out'))
+    for sub, sizeX in (('a', 1500), ('b', 900)):
+        out = tmp_path / 'out' / sub / 'x.tiff'
+        metadata = json.loads((out / 'metadata').read_text())
+        assert metadata['sizeX'] == sizeX
+        assert sorted(int(p.name) for p in (out / 'zxy').iterdir()) == list(
+            range(metadata['levels']))
+
+
+def test_export_refuses_other_source(tmp_path):
+    first = write_image(tmp_path / 'a.tiff', 600, 400)
+    second = write_image(tmp_path / 'b.tiff', 900, 600)
+    opts = make_opts(tmp_path / 'out')
+    export.export_source(first, opts.export, opts)
+    with pytest.raises(Exception, match='partial export'):
+        export.export_source(second, opts.export, opts)
+    # the same source resumes without redoing anything
+    export.export_source(first, opts.export, opts)
+
+
+def test_export_keeps_uniform_tiles(tmp_path):
+    source = write_image(tmp_path / 'black.tiff', 600, 400, value=0)
+    opts = make_opts(tmp_path / 'out', export_format='archive')
+    export.export_source(source, opts.export, opts)
+    index = json.loads((tmp_path / 'out' / 'tiles.json').read_text())
+    assert len(index) == 6 + 2 + 1
+
+
+def test_export_skips_transparent_tiles(tmp_path, monkeypatch):
+    image = np.full((400, 600, 4), 200, dtype=np.uint8)
+    image[:, 256:512, 3] = 0
+    source = tmp_path / 'alpha.tiff'
+    tifffile.imwrite(source, image, tile=(256, 256), photometric='rgb', extrasamples=[2])
+    # png tiles keep the alpha channel
+    monkeypatch.setattr(
+        export, '_open_source', lambda source, opts: large_image.open(source, encoding='PNG'))
+    opts = make_opts(tmp_path / 'out')
+    assert export.render_row(str(source), opts, 2, 0, 3, opts.export) == [0, 2]
+    assert sorted(p.name for p in (tmp_path / 'out' / 'zxy' / '2').iterdir()) == ['0', '2']
+    opts.export_keep_blank = True
+    assert export.render_row(str(source), opts, 2, 0, 3, opts.export) == [0, 1, 2]
@@ -0,0 +1,186 @@
+import argparse
+import http.server
+import re
+import threading
+
+import numpy as np
+import pytest
+
+from liv import httpsource
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if not match or not self.server.ranges:
+            self.server.requests.append((self.path, None, None, self.client_address[1]))
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        start, end = int(match[1]), min(int(match[2]), len(data) - 1)
+        self.server.requests.append((self.path, start, end, self.client_address[1]))
+        self.send_response(206)
+        self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', f'"{len(data)}"')
+        self.end_headers()
+        self.wfile.write(data[start:end + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    srv.files = {}
+    srv.requests = []
+    srv.ranges = True
+    srv.url = f'http://127.0.0.1:{srv.server_port}'
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def open_file(server, path, data, cacheSize=1024 ** 2, readAhead=0):
+    server.files[path] = data
+    return httpsource.HttpFile(
+        server.url + path, pool=httpsource.ConnectionPool(),
+        cache=httpsource.BlockCache(cacheSize), blockSize=1024, readAhead=readAhead)
+
+
+def test_read_and_seek(server):
+    data = np.random.default_rng(0).bytes(100000)
+    fptr = open_file(server, '/a', data, readAhead=2)
+    assert fptr.size == len(data)
+    fptr.seek(5000)
+    assert fptr.read(3000) == data[5000:8000]
+    assert fptr.tell() == 8000
+    fptr.seek(-10, 2)
+    assert fptr.read() == data[-10:]
+    fptr.seek(0)
+    assert fptr.read() == data
+    rng = np.random.default_rng(1)
+    for _ in range(100):
+        offset, length = int(rng.integers(len(data))), int(rng.integers(5000))
+        assert fptr.pread(length, offset) == data[offset:offset + length]
+    # every request reused one keep-alive connection
+    assert len({request[3] for request in server.requests}) == 1
+
+
+def test_coalesce(server):
+    data = bytes(range(256)) * 32
+    fptr = open_file(server, '/a', data)
+    fptr.pread(10, 0)
+    fptr.pread(10, 3 * 1024)
+    del server.requests[:]
+    assert fptr.pread(4096, 0) == data[:4096]
+    # blocks 1 and 2 are fetched together
+    assert server.requests == [('/a', 1024, 3071, server.requests[0][3])]
+
+
+def test_read_ahead(server):
+    data = bytes(range(256)) * 40
+    fptr = open_file(server, '/a', data, readAhead=3)
+    del server.requests[:]
+    assert fptr.pread(10, 0) == data[:10]
+    assert [request[1:3] for request in server.requests] == [(0, 4095)]
+    assert fptr.pread(100, 3000) == data[3000:3100]
+    assert len(server.requests) == 1
+    # read-ahead stops at the end of the file
+    assert fptr.pread(10, 9 * 1024) == data[9 * 1024:9 * 1024 + 10]
+    assert server.requests[-1][1:3] == (9 * 1024, len(data) - 1)
+
+
+def test_cache_eviction(server):
+    data = bytes(range(256)) * 32
+    fptr = open_file(server, '/a', data, cacheSize=2048)
+    for block in range(4):
+        fptr.pread(10, block * 1024)
+    assert fptr.cache.size <= 2048
+    del server.requests[:]
+    fptr.pread(10, 3 * 1024)
+    assert not server.requests
+    fptr.pread(10, 0)
+    assert len(server.requests) == 1
+
+
+def test_range_not_supported(server):
+    server.ranges = False
+    with pytest.raises(httpsource.RangeNotSupportedError):
+        open_file(server, '/a', b'x' * 100000)
+    assert len(server.requests) == 1
+
+
+def test_disk_cache(server, tmp_path):
+    cache = httpsource.DiskCache(str(tmp_path), maxSize=15000)
+    paths = []
+    for name in ('a', 'b'):
+        data = name.encode() * 10000
+        paths.append(cache.local_path(open_file(server, f'/{name}', data, readAhead=1)))
+        with open(paths[-1], 'rb') as fptr:
+            assert fptr.read() == data
+    count = len(server.requests)
+    assert cache.local_path(open_file(server, '/b', b'b' * 10000)) == paths[1]
+    # only the size probe is needed for a cached file
+    assert len(server.requests) == count + 1
+    # the older file was removed to stay under the size cap
+    assert [path.exists() for path in map(tmp_path.joinpath, paths)] == [False, True]
+
+
+def test_open_tiff(server, tmp_path, monkeypatch):
+    large_image = pytest.importorskip('large_image')
+    tifffile = pytest.importorskip('tifffile')
+    from liv import liv
+
+    image = np.random.default_rng(0).integers(0, 255, (2000, 3000, 3), dtype=np.uint8)
+    path = tmp_path / 'sample.tiff'
+    tifffile.imwrite(path, image, tile=(256, 256), photometric='rgb')
+    server.files['/sample.tiff'] = path.read_bytes()
+    monkeypatch.setattr(httpsource.defaultDiskCache, 'path', str(tmp_path / 'cache'))
+    monkeypatch.setattr(httpsource, 'DEFAULT_BLOCK_SIZE', 16384)
+    monkeypatch.setattr(httpsource, 'DEFAULT_READ_AHEAD', 1)
+    monkeypatch.setattr(liv, 'sourceCache', {})
+    opts = argparse.Namespace(style=None, usesource=None, skipsource=None)
+    ts = liv.open_source(server.url + '/sample.tiff', opts)
+    assert (ts.sizeX, ts.sizeY) == (3000, 2000)
+    region = ts.getRegion(
+        region={'left': 300, 'top': 200, 'width': 100, 'height': 50},
+        format=large_image.constants.TILE_FORMAT_NUMPY)[0]
+    assert np.array_equal(region[:, :, :3], image[200:250, 300:400])
+    assert all(request[1] is not None for request in server.requests)
+    # the tiles were read in place rather than by copying the file
+    assert not (tmp_path / 'cache').exists()
+    fetched = sum(request[2] - request[1] + 1 for request in server.requests)
+    assert fetched < len(server.files['/sample.tiff']) / 10
+
+
+def test_open_copied(server, tmp_path, monkeypatch):
+    large_image = pytest.importorskip('large_image')
+    pytest.importorskip('large_image_source_pil')
+    import PIL.Image
+
+    from liv import liv
+
+    image = np.random.default_rng(0).integers(0, 255, (100, 150, 3), dtype=np.uint8)
+    path = tmp_path / 'sample.png'
+    PIL.Image.fromarray(image).save(path)
+    server.files['/sample.png'] = path.read_bytes()
+    monkeypatch.setattr(httpsource.defaultDiskCache, 'path', str(tmp_path / 'cache'))
+    monkeypatch.setattr(liv, 'sourceCache', {})
+    opts = argparse.Namespace(style=None, usesource=None, skipsource=None)
+    ts = liv.open_source(server.url + '/sample.png', opts)
+    region = ts.getRegion(format=large_image.constants.TILE_FORMAT_NUMPY)[0]
+    assert np.array_equal(region[:, :, :3], image)
+    # formats that need a path are copied to the disk cache
+    assert len(list((tmp_path / 'cache').iterdir())) == 1
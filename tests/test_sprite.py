@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+large_image = pytest.importorskip('large_image')
+tifffile = pytest.importorskip('tifffile')
+
+from liv import liv  # noqa: E402
+
+
+def test_frame_sprite(tmp_path):
+    # each frame is a uniform shade so its cell can be identified
+    image = np.zeros((5, 300, 400), dtype=np.uint8)
+    for frame in range(5):
+        image[frame] = 40 * (frame + 1)
+    path = tmp_path / 'frames.tiff'
+    tifffile.imwrite(path, image, tile=(256, 256), metadata={'axes': 'ZYX'})
+    ts = large_image.open(str(path))
+    assert len(ts.metadata['frames']) == 5
+    sprite, columns = liv.frame_sprite(ts, {'left': 0, 'top': 0}, 100, 100)
+    # 5 frames make a 3 x 2 grid of 100 x 75 cells
+    assert columns == 3
+    assert sprite.size == (300, 150)
+    pixels = np.array(sprite.convert('L'))
+    for frame in range(5):
+        x, y = (frame % columns) * 100, (frame // columns) * 75
+        assert abs(int(pixels[y + 37, x + 50]) - 40 * (frame + 1)) <= 1
+    # the unused cell is empty
+    assert pixels[112, 250] == 0
+    sprite, columns = liv.frame_sprite(ts, {}, 100, 100, maxFrames=4)
+    assert (columns, sprite.size) == (2, (200, 150))
+
+
+def test_sprite_region():
+    metadata = {'sizeX': 10000, 'sizeY': 6000, 'tileWidth': 256, 'tileHeight': 256,
+                'levels': 7}
+    # nearby views of the same size share a region on the level's tile grid
+    first = liv.sprite_region(metadata, 1000, 1200, 2900, 2400, 256)
+    assert first == liv.sprite_region(metadata, 1100, 1300, 3000, 2500, 256)
+    assert first == {'left': 0, 'top': 0, 'right': 4096, 'bottom': 4096}
+    # the region is clamped to the image
+    assert liv.sprite_region(metadata, -50, None, 20000, None, 256) == {
+        'left': 0, 'top': 0, 'right': 10000, 'bottom': 6000}
+    assert liv.sprite_region(metadata, 300, 300, 310, 310, 256) == {
+        'left': 256, 'top': 256, 'right': 512, 'bottom': 512}
@@ -0,0 +1,60 @@
+import os
+import queue
+import threading
+
+from liv import watch
+
+
+def touch(path, data=b'x'):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_source_matches(tmp_path):
+    touch(tmp_path / 'a' / 'x.tif')
+    touch(tmp_path / 'a' / 'skip' / 'y.tif')
+    touch(tmp_path / 'b' / 'z.png')
+    sources = [str(tmp_path / 'a'), '-' + str(tmp_path / 'a' / 'skip'),
+               str(tmp_path / 'b' / '*.tif')]
+    assert watch.source_matches(str(tmp_path / 'a' / 'x.tif'), sources)
+    assert watch.source_matches(str(tmp_path / 'a' / '.' / 'new.tif'), sources)
+    assert not watch.source_matches(str(tmp_path / 'a' / 'skip' / 'y.tif'), sources)
+    assert watch.source_matches(str(tmp_path / 'b' / 'new.tif'), sources)
+    assert not watch.source_matches(str(tmp_path / 'b' / 'z.png'), sources)
+    assert not watch.source_matches(str(tmp_path / 'b' / 'sub' / 'new.tif'), sources)
+    assert not watch.source_matches(str(tmp_path / 'c.tif'), sources)
+
+
+def test_watch_roots(tmp_path):
+    single = touch(tmp_path / 'one' / 'x.tif')
+    touch(tmp_path / 'tree' / 'sub' / 'y.tif')
+    sources = [single, str(tmp_path / 'tree') + os.sep, str(tmp_path / 'glob' / '*' / '*.tif'),
+               '-' + str(tmp_path / 'tree' / 'sub'), 'https://example.com/a.tif']
+    (tmp_path / 'glob').mkdir()
+    assert watch.watch_roots(sources) == [
+        (str(tmp_path / 'glob'), True),
+        (str(tmp_path / 'one'), False),
+        (str(tmp_path / 'tree'), True)]
+    # a directory that is also the parent of a file source is recursive
+    assert watch.watch_roots([single, str(tmp_path / 'one')]) == [(str(tmp_path / 'one'), True)]
+
+
+def test_watch_sources_polling(tmp_path):
+    first = touch(tmp_path / 'a.tif')
+    sources = [str(tmp_path / '*.tif')]
+    known = {first: watch.file_signature(first)}
+    events = queue.Queue()
+    thread = threading.Thread(
+        target=watch.watch_sources,
+        args=(sources, known, lambda changed, removed: events.put((changed, removed))),
+        kwargs={'settle': 0.2, 'poll': 0.1, 'useInotify': False}, daemon=True)
+    thread.start()
+    second = touch(tmp_path / 'b.tif')
+    touch(tmp_path / 'c.png')
+    assert events.get(timeout=10) == ([second], [])
+    touch(tmp_path / 'a.tif', b'changed')
+    assert events.get(timeout=10) == ([first], [])
+    os.unlink(second)
+    assert events.get(timeout=10) == ([], [second])
+    assert events.empty()